@@ -0,0 +1,95 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""
+Compiled version of srt_file._parse_blocks, used automatically once built:
+
+    cythonize -i src/_srt_fast.pyx
+
+Gives exactly the same subtitles; the gain is in checking and reading the
+usual fixed-width timestamp line in C instead of with a regex.
+"""
+
+from src.srt_file import _MAX_DIGITS, _read_timestamp, _split_blocks, _warn_bad_block
+
+# '0' stands for any ASCII digit
+cdef str _FIXED_LAYOUT = '00:00:00,000 --> 00:00:00,000'
+
+
+cdef inline bint _is_fixed_layout(str timestamp):
+    cdef Py_ssize_t i
+    cdef Py_UCS4 char, expected
+    if len(timestamp) != 29:
+        return False
+    for i in range(29):
+        char = timestamp[i]
+        expected = _FIXED_LAYOUT[i]
+        if expected == u'0':
+            if char < u'0' or char > u'9':
+                return False
+        elif char != expected:
+            return False
+    return True
+
+
+cdef inline long long _digit(str text, Py_ssize_t i):
+    return <long long>(<Py_UCS4>text[i]) - 48
+
+
+cdef long long _fixed_time_ms(str timestamp, Py_ssize_t at):
+    return ((((_digit(timestamp, at) * 10 + _digit(timestamp, at + 1)) * 60
+              + _digit(timestamp, at + 3) * 10 + _digit(timestamp, at + 4)) * 60
+             + _digit(timestamp, at + 6) * 10 + _digit(timestamp, at + 7)) * 1000
+            + _digit(timestamp, at + 9) * 100 + _digit(timestamp, at + 10) * 10
+            + _digit(timestamp, at + 11))
+
+
+def parse_blocks(str content, build_subtitle, str filename):
+    """Parse every well-formed block in the content, skipping the rest with a warning"""
+    cdef list blocks = _split_blocks(content)
+    cdef list subtitles = [None] * len(blocks)
+    cdef Py_ssize_t count = 0
+    cdef str block, number, timestamp, text
+    cdef list lines
+    cdef object start_time_ms, end_time_ms
+
+    for block in blocks:
+        # Only the first block can start with whitespace (leading blank lines)
+        if block[:1].isspace():
+            block = block.lstrip()
+
+        # Number, timestamp, and everything else is the text
+        lines = block.split('\n', 2)
+        if len(lines) < 3:
+            continue
+
+        number = lines[0]
+        if not number.isdecimal():
+            number = number.strip()
+            if not number.isdecimal():
+                _warn_bad_block(filename, block)
+                continue
+        if len(number) > _MAX_DIGITS:
+            _warn_bad_block(filename, block)
+            continue
+
+        timestamp = lines[1]
+        if _is_fixed_layout(timestamp):
+            start_time_ms = _fixed_time_ms(timestamp, 0)
+            end_time_ms = _fixed_time_ms(timestamp, 17)
+        else:
+            read = _read_timestamp(timestamp)
+            if read is None:
+                _warn_bad_block(filename, block)
+                continue
+            timestamp, start_time_ms, end_time_ms = read
+
+        # rstrip() hands back the same string when there is nothing to strip, so no copy
+        text = lines[2].rstrip()
+        # Skip empty subtitles - they're just noise from the AI model
+        if not text:
+            continue
+
+        subtitles[count] = build_subtitle(number, timestamp, text, start_time_ms, end_time_ms)
+        count += 1
+
+    del subtitles[count:]
+    return subtitles
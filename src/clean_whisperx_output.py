@@ -9,15 +9,30 @@ the training data having such non-real dialogue transcriptions during silence.
 
 """
 
+import functools
+import multiprocessing
 import os
-import re
-from typing import List, Dict, Any, TypedDict
-
-from src.junk_patterns import JUNK_PATTERNS
+import threading
+from bisect import bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from itertools import accumulate
+from multiprocessing.queues import Queue
+from typing import List, Dict, Any, Iterable, Optional, Protocol, TextIO, Tuple, TypedDict
+
+from src.junk_patterns import (
+    BULK_NEEDLES,
+    BULK_SEPARATOR,
+    EXACT_JUNK,
+    HYPERSCAN_AVAILABLE,
+    JUNK_PREFIX_GROUPS,
+    UNPREFIXED_JUNK_GROUP,
+    ascii_mode_safe,
+    hs_scan
+)
 
 from src.colors_printer import colored_print, colored_print_info_type
 
-from src.srt_file import SRTFile, SubtitleDict
+from src.srt_file import SRTFile, Subtitle
 
 from src.shared_utils import (
     make_cleaned_srt_filename,
@@ -26,9 +41,6 @@ from src.shared_utils import (
     remove_srt_extension
 )
 
-# For in case you wish to log all removals from a batch of runs into one log file.
-current_main_log_file = ""
-
 
 class RealSubtitlesResult(TypedDict):
     removed_count: int
@@ -36,25 +48,123 @@ class RealSubtitlesResult(TypedDict):
     empty_string_count: int
 
 
+class OnePassResult(TypedDict):
+    phony_subtitles: List[Subtitle]
+    subtitles_sans_bad_output: List[Subtitle]
+    empty_string_count: int
+
+
+class BatchLogHandle(Protocol):
+    """All the batch log needs: an open file, or a worker's stand-in for one"""
+
+    def write(self, text: str, /) -> Any: ...
+
+
+def _is_junk(text: str) -> bool:
+    # Anchored patterns need the surrounding whitespace gone, but most texts have
+    # none, so only pay for the strip() copy when there is some to remove.
+    if text[:1].isspace() or text[-1:].isspace():
+        text = text.strip()
+
+    lowered = text.lower()
+    if lowered in EXACT_JUNK:
+        return True
+
+    # One C-level substring search per prefix decides which regexes are worth running
+    candidate_groups = [pair for prefix, group in JUNK_PREFIX_GROUPS.items()
+                        if prefix in lowered for pair in group]
+    if UNPREFIXED_JUNK_GROUP is not None:
+        candidate_groups.extend(UNPREFIXED_JUNK_GROUP)
+    if not candidate_groups:
+        return False
+
+    if HYPERSCAN_AVAILABLE:
+        return hs_scan(text)
+
+    use_ascii = ascii_mode_safe(text)
+    for junk_re, ascii_junk_re in candidate_groups:
+        if use_ascii and ascii_junk_re is not None:
+            junk_re = ascii_junk_re
+        if junk_re.search(text):
+            return True
+
+    return False
+
+
+def _renumber_subtitles(subtitles: Iterable[Subtitle]) -> Tuple[List[Subtitle], int]:
+    """Number the subtitles from 1 with no gaps, and count the empty ones"""
+    subtitles_out: List[Subtitle] = []
+    empty_string_count = 0
+    for subtitle in subtitles:
+        number = len(subtitles_out) + 1
+        if subtitle.number != number:
+            subtitle = subtitle._replace(number=number)
+        if subtitle.text == "":
+            empty_string_count += 1
+        subtitles_out.append(subtitle)
+
+    return subtitles_out, empty_string_count
+
+
 class SrtCleaner:
 
     def __init__(self, srt_file: SRTFile) -> None:
         self.srt_file: SRTFile = srt_file
 
-    def find_phony_subtitles(self) -> List[SubtitleDict]:
+    def find_phony_subtitles(self) -> List[Subtitle]:
         """Find subtitles that match phony patterns"""
 
-        phony_subtitles: List[SubtitleDict] = []
+        subtitles = self.srt_file.subtitles
+        phony_subtitles: List[Subtitle] = [
+            subtitles[i] for i in self._find_phony_indices()]
+
+        return phony_subtitles
 
-        for subtitle in self.srt_file.subtitles:
-            text = subtitle['text'].lower().strip()
+    def _find_phony_indices(self) -> List[int]:
+        """Indices of the phony subtitles, in order"""
+        texts = [subtitle.text for subtitle in self.srt_file.subtitles]
 
-            for pattern in JUNK_PATTERNS:
-                if re.search(pattern, text, re.IGNORECASE):
-                    phony_subtitles.append(subtitle)
-                    break
+        if BULK_NEEDLES is None:
+            return [i for i, text in enumerate(texts) if _is_junk(text)]
 
-        return phony_subtitles
+        # Lowercase and search all the texts at once with C-level str.find instead
+        # of one Python-level check per subtitle; only the hits get looked at.
+        joined_texts = BULK_SEPARATOR.join(texts)
+        lowered_texts = joined_texts.lower()
+        if len(lowered_texts) != len(joined_texts):
+            # A few characters lowercase to two ('İ'), which shifts the offsets
+            return [i for i, text in enumerate(texts) if _is_junk(text)]
+
+        text_starts = list(accumulate(
+            (len(text) + len(BULK_SEPARATOR) for text in texts), initial=0))
+
+        candidate_indices = set()
+        for needle in BULK_NEEDLES:
+            position = lowered_texts.find(needle)
+            while position != -1:
+                index = bisect_right(text_starts, position) - 1
+                candidate_indices.add(index)
+                # One hit is enough to make a subtitle a candidate
+                position = lowered_texts.find(needle, text_starts[index + 1])
+
+        return [i for i in sorted(candidate_indices) if _is_junk(texts[i])]
+
+    def clean_in_one_pass(self) -> OnePassResult:
+        """Split phony from real subtitles, renumbering the real ones, in a single scan"""
+
+        subtitles = self.srt_file.subtitles
+        phony_indices = self._find_phony_indices()
+        phony_subtitles: List[Subtitle] = [subtitles[i] for i in phony_indices]
+
+        phony_index_set = set(phony_indices)
+        subtitles_out, empty_string_count = _renumber_subtitles(
+            subtitle for i, subtitle in enumerate(subtitles) if i not in phony_index_set)
+
+        return {
+            'phony_subtitles': phony_subtitles,
+            'subtitles_sans_bad_output': subtitles_out,
+            'empty_string_count': empty_string_count
+        }
 
     def remove_junk_subtitles(self, phony_subtitles) -> RealSubtitlesResult:
         """Remove phony subtitles and optionally save cleaned file"""
@@ -64,53 +174,32 @@ class SrtCleaner:
         print(
             f"\nFound {len(phony_subtitles)} phony subtitle(s) in {self.srt_file.filename}:")
         for sub in phony_subtitles:
-            print(f"  - #{sub['number']}: {sub['text'][:50]}...")
-
-        subtitles_out = []
+            print(f"  - #{sub.number}: {sub.text[:50]}...")
 
-        # Remove phony subtitles
-        subtitles_out = [
-            sub for sub in self.srt_file.subtitles if sub not in phony_subtitles]
+        # The phony subtitles came out of this same list, so identity is enough
+        phony_ids = {id(sub) for sub in phony_subtitles}
 
-        # Renumber subtitles
-        for i, subtitle in enumerate(subtitles_out, 1):
-            subtitle['number'] = i
+        # Remove phony subtitles, renumbering the survivors as we go
+        subtitles_out, empty_string_count = _renumber_subtitles(
+            subtitle for subtitle in self.srt_file.subtitles if id(subtitle) not in phony_ids)
 
         return {
             'removed_count': len(phony_subtitles),
             'subtitles_sans_bad_output': subtitles_out,
-            "empty_string_count": len([x for x in subtitles_out if x["text"] == ""])
+            "empty_string_count": empty_string_count
         }
 
-    @staticmethod
-    def prepare_cleaned_content_for_write(cleaned_subtitles):
-        """
-        I have no memory of writing the stuff that is appended, nor do I know why it must be written.
-        """
-        cleaned_content = []
-
-        for subtitle in cleaned_subtitles:
-            cleaned_content.append(f"{subtitle['number']}")
-            cleaned_content.append(subtitle['timestamp'])
-            cleaned_content.append(subtitle['text'])
-            cleaned_content.append("")  # Empty line between subtitles
-
-        # Remove the last empty line
-        if cleaned_content and cleaned_content[-1] == "":
-            cleaned_content.pop()
-
-        return cleaned_content
-
-    def save_cleaned_file(self, subtitles_ready_for_write):
+    def save_cleaned_file(self, cleaned_subtitles: List[Subtitle]):
         """Save the cleaned subtitles to a new file with ' - cleaned' suffix"""
 
         # Create new filename with -cleaned suffix
-        base_name = os.path.splitext(self.srt_file.filepath)[
-            0]  # Remove .srt extension
-        cleaned_filepath: str = make_cleaned_srt_filename(base_name)
+        cleaned_filepath: str = make_cleaned_srt_filename(self.srt_file.filepath)
 
         with open(cleaned_filepath, 'w', encoding='utf-8') as file:
-            file.write('\n'.join(subtitles_ready_for_write))
+            # One string per subtitle block, blocks separated by a blank line
+            file.write('\n\n'.join(
+                f"{subtitle.number}\n{subtitle.timestamp}\n{subtitle.text}"
+                for subtitle in cleaned_subtitles))
 
         cleaned_filename = os.path.basename(cleaned_filepath)
         colored_print("#######" * 3, 2)
@@ -120,35 +209,44 @@ class SrtCleaner:
         return cleaned_filepath
 
     def save_without_changes(self):
-        cleaned_subtitles_prepared_for_write = self.prepare_cleaned_content_for_write(
-            self.srt_file.subtitles)
-        return self.save_cleaned_file(cleaned_subtitles_prepared_for_write)
+        return self.save_cleaned_file(self.srt_file.subtitles)
 
-    def create_phony_subtitles_log(self, phony_subtitles: List[SubtitleDict], input_srt_path):
+    def create_phony_subtitles_log(self, phony_subtitles: List[Subtitle], input_srt_path,
+                                   batch_log_handle: Optional[BatchLogHandle] = None):
         base_filename = remove_srt_extension(input_srt_path)
         if len(phony_subtitles) == 0:
             log_name = make_empty_log_filename(base_filename)
         else:
             log_name = make_log_with_cleaned_lines(base_filename)
 
+        log_lines = ''.join(sub.text + "\n" for sub in phony_subtitles)
+
         with open(log_name, "w") as f:
-            for sub in phony_subtitles:
-                f.write(sub["text"])
-                f.write("\n")
+            f.write(log_lines)
 
-        using_batch_log_file = current_main_log_file != "" and current_main_log_file.endswith(
-            ".txt")
-        if using_batch_log_file:
-            with open(current_main_log_file, "a") as v:
-                for sub in phony_subtitles:
-                    v.write(sub["text"])
-                    v.write("\n")
+        if batch_log_handle is not None:
+            batch_log_handle.write(log_lines)
 
         return log_name
 
 
-def clean_srt_file(input_file_path: str, dry_run: bool = True, with_logging: bool = False) -> Dict[str, Any]:
-    """Process a single SRT file"""
+def open_batch_log(log_path: str) -> TextIO:
+    """
+    For in case you wish to log all removals from a batch of runs into one log file.
+
+    Open it once, pass the handle to every clean_srt_file call, then close it.
+    """
+    return open(log_path, "a", buffering=1 << 20)
+
+
+def clean_srt_file(input_file_path: str, dry_run: bool = True, with_logging: bool = False,
+                   batch_log_handle: Optional[BatchLogHandle] = None,
+                   use_cache: bool = False) -> Dict[str, Any]:
+    """Process a single SRT file
+
+    With logging on, removed lines also go to batch_log_handle (see open_batch_log) if given.
+    With use_cache, the parse is kept in a '.srt.cache' file beside the input for next time.
+    """
 
     if not os.path.exists(input_file_path):
         print(f"Error: File '{input_file_path}' does not exist")
@@ -162,45 +260,40 @@ def clean_srt_file(input_file_path: str, dry_run: bool = True, with_logging: boo
     print(f"\nProcessing: {input_filename}")
 
     try:
-        srt_file = SRTFile(input_file_path)
+        srt_file = SRTFile(input_file_path, use_cache=use_cache)
         srt_file.parse()
 
         srt_cleaner = SrtCleaner(srt_file)
 
         print(f"  - Parsed {len(srt_file.subtitles)} subtitles")
 
-        # Find phony subtitles
-        phony_subtitles: List[SubtitleDict] = srt_cleaner.find_phony_subtitles(
-        )
+        # Find phony subtitles and drop them, in one scan
+        pass_result: OnePassResult = srt_cleaner.clean_in_one_pass()
+        phony_subtitles: List[Subtitle] = pass_result["phony_subtitles"]
         if with_logging:
             log_loc = srt_cleaner.create_phony_subtitles_log(
-                phony_subtitles, input_file_path)
+                phony_subtitles, input_file_path, batch_log_handle)
             print("##")
             print("## MAKING LOG FILE: at location: " + log_loc)
             print("##")
         phony_count = len(phony_subtitles)
+        # Renumbered even when nothing was removed, so gaps in the numbering close
+        srt_file.subtitles = pass_result["subtitles_sans_bad_output"]
 
         # Show phony subtitles if found
         if phony_subtitles:
             print(f"  - Found {phony_count} PHONY subtitle(s):")
             for sub in phony_subtitles:
-                print(f"    #{sub['number']}: {sub['text'][:80]}...")
+                print(f"    #{sub.number}: {sub.text[:80]}...")
 
-            # Remove phony subtitles
-            removal_result: RealSubtitlesResult = srt_cleaner.remove_junk_subtitles(
-                phony_subtitles)
-
-            srt_file.subtitles = removal_result["subtitles_sans_bad_output"]
-            cleaned_subtitles_prepared_for_write = srt_cleaner.prepare_cleaned_content_for_write(
-                removal_result["subtitles_sans_bad_output"])
             cleaned_filepath = srt_cleaner.save_cleaned_file(
-                cleaned_subtitles_prepared_for_write)
+                srt_file.subtitles)
 
             result = {
                 'filename': input_filename,
                 'filepath': input_file_path,
                 'subtitle_count': len(srt_file.subtitles),
-                "empty_string_count": removal_result["empty_string_count"],
+                "empty_string_count": pass_result["empty_string_count"],
                 'phony_count': phony_count,
                 'cleaned_file': cleaned_filepath,
                 'success': True
@@ -234,6 +327,77 @@ def clean_srt_file(input_file_path: str, dry_run: bool = True, with_logging: boo
         }
 
 
+# Set in each clean_many worker process; batch log lines are sent back through it
+_worker_log_queue: Optional["Queue[Optional[str]]"] = None
+
+
+class _QueueWriter:
+    """Stands in for the batch log handle inside a worker process"""
+
+    def __init__(self, log_queue: "Queue[Optional[str]]") -> None:
+        self.log_queue = log_queue
+
+    def write(self, text: str) -> None:
+        self.log_queue.put(text)
+
+
+def _init_clean_worker(log_queue: Optional["Queue[Optional[str]]"]) -> None:
+    global _worker_log_queue
+    _worker_log_queue = log_queue
+
+
+def _clean_in_worker(input_file_path: str, dry_run: bool, with_logging: bool,
+                     use_cache: bool) -> Dict[str, Any]:
+    batch_log_handle: Optional[BatchLogHandle] = None
+    if _worker_log_queue is not None:
+        batch_log_handle = _QueueWriter(_worker_log_queue)
+    return clean_srt_file(input_file_path, dry_run, with_logging, batch_log_handle, use_cache)
+
+
+def _write_queued_log_lines(log_queue: "Queue[Optional[str]]", batch_log_handle: TextIO) -> None:
+    # None is the sentinel for "every worker is done"
+    for text in iter(log_queue.get, None):
+        batch_log_handle.write(text)
+
+
+def clean_many(input_file_paths: Iterable[str], workers: Optional[int] = None, dry_run: bool = True,
+               with_logging: bool = False, batch_log_path: Optional[str] = None,
+               use_cache: bool = False) -> List[Dict[str, Any]]:
+    """Process many SRT files in parallel, one process per CPU unless workers is given
+
+    Files are independent, so each is cleaned by clean_srt_file in a worker process.
+    With batch_log_path, a single thread here does all the writes to the batch log.
+    """
+    # Spawned, not forked: the log writer thread may already be running, and forking
+    # a process with threads in it can deadlock the children
+    mp_context = multiprocessing.get_context('spawn')
+    log_queue: Optional["Queue[Optional[str]]"] = None
+    batch_log: Optional[TextIO] = None
+    log_writer: Optional[threading.Thread] = None
+    if batch_log_path is not None:
+        log_queue = mp_context.Queue()
+        batch_log = open_batch_log(batch_log_path)
+        log_writer = threading.Thread(
+            target=_write_queued_log_lines, args=(log_queue, batch_log))
+        log_writer.start()
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=mp_context,
+                                 initializer=_init_clean_worker, initargs=(log_queue,)) as executor:
+            clean_one = functools.partial(
+                _clean_in_worker, dry_run=dry_run, with_logging=with_logging, use_cache=use_cache)
+            results = list(executor.map(clean_one, input_file_paths, chunksize=8))
+    finally:
+        if log_queue is not None:
+            log_queue.put(None)
+        if log_writer is not None:
+            log_writer.join()
+        if batch_log is not None:
+            batch_log.close()
+
+    return results
+
+
 if __name__ == "__main__":
     import argparse
 
@@ -243,6 +407,8 @@ if __name__ == "__main__":
                         help='Path to the SRT file to process')
     parser.add_argument('--clean', action='store_true',
                         help='Actually remove phony subtitles (default: dry run)')
+    parser.add_argument('--cache', action='store_true',
+                        help='Keep the parsed subtitles in a .srt.cache file so re-runs skip parsing')
 
     args = parser.parse_args()
 
@@ -254,7 +420,7 @@ if __name__ == "__main__":
         print("Running in DRY RUN mode - file will not be modified")
         print("Use --clean flag to actually remove phony subtitles")
 
-    result = clean_srt_file(args.filepath, dry_run=not args.clean)
+    result = clean_srt_file(args.filepath, dry_run=not args.clean, use_cache=args.cache)
 
     if result.get('success'):
         print(f"\n" + "=" * 40)
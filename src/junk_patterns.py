@@ -3,6 +3,16 @@ Configurable patterns for detecting junk subtitles.
 Users can modify this file for their language/use case.
 """
 
+import os
+import re
+import threading
+from typing import Dict, List
+
+try:
+    import hyperscan  # type: ignore[import-not-found]
+except ImportError:
+    hyperscan = None  # type: ignore[assignment]
+
 JUNK_PATTERNS = [
     # Can use patterns that vary somewhat
     r'sous.titrage.*st[\'"]?\s*\d+',  # "Sous-titrage ST' 501"
@@ -24,3 +34,238 @@ JUNK_PATTERNS = [
 #     r'pattern1',
 #     r'pattern2',
 # ]
+
+
+# Compiled forms of the patterns above, nothing to edit below this line.
+
+def _check_patterns(patterns):
+    """Raise a ValueError naming the first pattern that isn't a valid regex"""
+    for pattern in patterns:
+        try:
+            re.compile(pattern)
+        except re.error as error:
+            raise ValueError(
+                f"Junk pattern {pattern!r} in junk_patterns.py is not a valid regex: {error}") from None
+
+
+_check_patterns(JUNK_PATTERNS)
+
+# Inline global flags such as (?i) are only allowed at the very start of an expression
+_GLOBAL_FLAGS_RE = re.compile(r'\(\?[aiLmsux]+\)')
+
+
+def _combinable(pattern):
+    """True if the pattern still means the same inside a (?:p1)|(?:p2) alternation
+
+    Global flags must come first in the whole expression, and group numbers and
+    names, which backreferences like \\1 rely on, shift or clash once combined.
+    """
+    return _GLOBAL_FLAGS_RE.match(pattern) is None and re.compile(pattern).groups == 0
+
+
+_REGEX_METACHARS = frozenset(".^$*+?{}[]|()")
+
+
+def _exact_literal(pattern):
+    """Return the lowercased text of a '^literal$' pattern, or None if it needs the regex engine"""
+    if not (pattern.startswith("^") and pattern.endswith("$")):
+        return None
+
+    literal = []
+    chars = iter(pattern[1:-1])
+    for char in chars:
+        if char == "\\":
+            escaped = next(chars, "")
+            # \d, \s, \b and friends are character classes, not literals
+            if not escaped or escaped.isalnum():
+                return None
+            literal.append(escaped)
+        elif char in _REGEX_METACHARS:
+            return None
+        else:
+            literal.append(char)
+
+    return "".join(literal).lower()
+
+
+# Exact-line patterns become a set lookup; the rest go through the regex.
+EXACT_JUNK = frozenset(
+    literal for literal in map(_exact_literal, JUNK_PATTERNS) if literal is not None)
+
+_REGEX_JUNK_PATTERNS = [p for p in JUNK_PATTERNS if _exact_literal(p) is None]
+
+# All remaining patterns folded into one alternation, so each subtitle is scanned once.
+# With no patterns left it falls back to a pattern that never matches. Patterns that
+# can't be combined safely are searched on their own, in SEPARATE_JUNK_RES.
+COMBINED_JUNK_RE = re.compile(
+    "|".join(f"(?:{p})" for p in _REGEX_JUNK_PATTERNS if _combinable(p)) or r"(?!)",
+    re.IGNORECASE)
+SEPARATE_JUNK_RES = [re.compile(p, re.IGNORECASE)
+                     for p in _REGEX_JUNK_PATTERNS if not _combinable(p)]
+
+
+def _literal_prefix(pattern):
+    """Return the lowercased literal text every match of the pattern starts with ('' if there is none)"""
+    # With a top-level alternation nothing is guaranteed; don't try to be clever
+    if "|" in pattern:
+        return ""
+
+    literal = []
+    chars = iter(pattern[1:] if pattern.startswith("^") else pattern)
+    for char in chars:
+        if char == "\\":
+            escaped = next(chars, "")
+            if not escaped or escaped.isalnum():
+                break
+            literal.append(escaped)
+        elif char in _REGEX_METACHARS:
+            # 'ab?c' only guarantees 'a'
+            if char in "*?{" and literal:
+                literal.pop()
+            break
+        else:
+            literal.append(char)
+
+    return "".join(literal).lower()
+
+
+# In str patterns \s also matches these four ASCII separators, under re.ASCII it doesn't
+_ASCII_MODE_MISMATCH_RE = re.compile('[\x1c-\x1f]')
+
+
+def ascii_mode_safe(text):
+    """True if the ASCII-mode regexes give the same answers as the Unicode ones on the text"""
+    # isascii() is a flag check on the string, not a scan
+    return text.isascii() and _ASCII_MODE_MISMATCH_RE.search(text) is None
+
+
+def _compile_regex_pair(expression, is_ascii):
+    """Compile (regex, ASCII-mode regex or None) for one expression"""
+    ascii_re = None
+    if is_ascii:
+        try:
+            ascii_re = re.compile(expression, re.IGNORECASE | re.ASCII)
+        except re.error:
+            # An inline (?u) can't be mixed with ASCII mode
+            pass
+    return re.compile(expression, re.IGNORECASE), ascii_re
+
+
+def _compile_group(patterns):
+    """Compile patterns into a list of (regex, ASCII-mode regex or None) pairs
+
+    Unicode-aware IGNORECASE is what makes the search slow. CPython already keeps
+    ASCII-only text in one byte per char, so for such text an ASCII-mode copy of
+    the pattern skips the case folding tables. It gives the same answers only on
+    text where ascii_mode_safe() is true, and is only built when the patterns
+    themselves are ASCII.
+
+    The combinable patterns share one pair; each of the others gets its own.
+    """
+    combinable = [p for p in patterns if _combinable(p)]
+    pairs = []
+    if combinable:
+        pairs.append(_compile_regex_pair("|".join(f"(?:{p})" for p in combinable),
+                                         all(p.isascii() for p in combinable)))
+    pairs.extend(_compile_regex_pair(p, p.isascii()) for p in patterns if not _combinable(p))
+    return pairs
+
+
+# Patterns grouped by the literal text they start with (e.g. "sous"). A group's
+# regex only runs on subtitles containing its prefix, which ordinary dialogue
+# rarely does; patterns without a usable prefix always run.
+_patterns_by_prefix: Dict[str, List[str]] = {}
+for _pattern in _REGEX_JUNK_PATTERNS:
+    _patterns_by_prefix.setdefault(_literal_prefix(_pattern), []).append(_pattern)
+
+UNPREFIXED_JUNK_GROUP = (_compile_group(_patterns_by_prefix.pop(""))
+                         if "" in _patterns_by_prefix else None)
+JUNK_PREFIX_GROUPS = {prefix: _compile_group(group)
+                      for prefix, group in _patterns_by_prefix.items()}
+
+
+# For scanning every subtitle of a file in one go: the lowered texts are joined
+# with a NUL, which no needle contains, so a hit always falls inside one text.
+BULK_SEPARATOR = "\x00"
+
+# Every junk subtitle contains one of these, so finding them in the joined text
+# narrows things down to a few candidates. Not possible when some pattern has no
+# literal prefix.
+BULK_NEEDLES = (tuple(sorted(set(JUNK_PREFIX_GROUPS) | EXACT_JUNK))
+                if UNPREFIXED_JUNK_GROUP is None else None)
+
+
+def _compile_hyperscan_db(patterns):
+    """Build a Hyperscan database for the patterns, or None if Hyperscan can't be used"""
+    if hyperscan is None or not patterns:
+        return None
+
+    flags = (hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_UTF8 |
+             hyperscan.HS_FLAG_UCP | hyperscan.HS_FLAG_SINGLEMATCH)
+    database = hyperscan.Database()
+    try:
+        database.compile(
+            expressions=[p.encode('utf-8') for p in patterns],
+            ids=list(range(len(patterns))),
+            elements=len(patterns),
+            flags=[flags] * len(patterns))
+    except hyperscan.error:
+        # Backreferences, lookarounds etc. aren't supported; stick with re
+        return None
+
+    return database
+
+
+# Optional: with SRT_CLEANER_HYPERSCAN=1 and Hyperscan installed, the same patterns are
+# scanned as one DFA. Opt-in only, as Hyperscan has been seen to miss matches that re
+# finds once they run past a couple of dozen bytes.
+USE_HYPERSCAN = os.environ.get("SRT_CLEANER_HYPERSCAN") == "1"
+_HS_DATABASE = _compile_hyperscan_db(_REGEX_JUNK_PATTERNS) if USE_HYPERSCAN else None
+HYPERSCAN_AVAILABLE = _HS_DATABASE is not None
+
+# Scratch space can't be shared between threads that scan at the same time
+_hs_local = threading.local()
+
+
+def _stop_scan(*_):
+    return True
+
+
+def hs_scan(text):
+    """True if any of the regex junk patterns matches the text, using Hyperscan"""
+    scratch = getattr(_hs_local, "scratch", None)
+    if scratch is None:
+        scratch = _hs_local.scratch = hyperscan.Scratch(_HS_DATABASE)
+
+    try:
+        _HS_DATABASE.scan(text.encode('utf-8'),
+                          match_event_handler=_stop_scan, scratch=scratch)
+    except hyperscan.ScanTerminated:
+        # Raised because _stop_scan halted the scan on the first match
+        return True
+
+    return False
+
+
+# Lines Hyperscan has been seen to get wrong, plus a couple of ordinary ones
+_HS_SELF_CHECK_TEXTS = (
+    "Sous-titrage Société Radio-Canada fr",
+    "Sous-titrage réalisé par la communauté d'Amara.org",
+    "Sous-titrage ST' 501",
+    "Je m'appelle Marinette",
+)
+
+
+def _hs_agrees_with_re():
+    """True if Hyperscan gives the same answers as re on the self-check lines"""
+    for text in _HS_SELF_CHECK_TEXTS:
+        expected = any(re.search(p, text, re.IGNORECASE) for p in _REGEX_JUNK_PATTERNS)
+        if hs_scan(text) != expected:
+            return False
+    return True
+
+
+if _HS_DATABASE is not None and not _hs_agrees_with_re():
+    print("Warning: Hyperscan disagrees with re on this machine; using re instead")
+    _HS_DATABASE = None
+    HYPERSCAN_AVAILABLE = False
@@ -1,18 +1,16 @@
 # shared_utils.py
+from pathlib import Path
+
 
 def remove_srt_extension(base_name):
     return base_name[:-4]
 
 
-def make_cleaned_srt_filename(base_name):
-    if "-input" in base_name:
-        return swap(base_name)
-    return f"{base_name} - cleaned.srt"
-
-
-def swap(base_name):
-    good_part = base_name.split("-input")[0]
-    return good_part + " - cleaned.srt"
+def make_cleaned_srt_filename(srt_filepath):
+    # "episode-input.srt" -> "episode - cleaned.srt", "episode.srt" -> "episode - cleaned.srt"
+    path = Path(srt_filepath)
+    good_part = path.stem.split("-input")[0]
+    return str(path.with_name(f"{good_part} - cleaned.srt"))
 
 
 empty_log_ending = " - empty_log.txt"
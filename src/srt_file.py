@@ -1,88 +1,381 @@
 # srt_file.py
+import codecs
+import functools
+import json
 import os
+from array import array
+from operator import attrgetter
 import re
+import sys
 
-from typing import List, TypedDict
+from typing import Iterator, List, NamedTuple, Optional, Sequence, Tuple
 
+# Blocks are separated by one or more whitespace-only lines
+_BLANK_LINE_RE = re.compile(r'\n\s*\n')
 
-class SubtitleDict(TypedDict):
+# A blank line that isn't empty; when there are none, a plain str.split is enough
+_SPACED_BLANK_LINE_RE = re.compile(r'\n[^\S\n]+\n')
+
+# int() refuses longer digit strings (PYTHONINTMAXSTRDIGITS, sys.set_int_max_str_digits);
+# such a block can only be corrupt. Read once at import, so a limit lowered later is missed.
+# With no limit (0, or a Python from before the limit) 4300 is kept as a sanity cap.
+_MAX_DIGITS = getattr(sys, 'get_int_max_str_digits', lambda: 0)() or 4300
+
+# One time of the timestamp line. Hours and the other fields may be short, and some
+# tools write a '.' before the milliseconds.
+_TIME = rf'(\d{{1,{_MAX_DIGITS}}}):(\d{{1,2}}):(\d{{1,2}})[,.](\d{{1,3}})'
+
+# The whole timestamp line, with the eight numbers split out. Anything after the end
+# time (SRT position coordinates such as 'X1:10 X2:20 Y1:30 Y2:40') stays part of it;
+# blanks around the line don't.
+_TIMESTAMP_RE = re.compile(
+    rf'[^\S\n]*(?P<timestamp>{_TIME}[^\S\n]*-->[^\S\n]*{_TIME}(?:[^\S\n]+\S[^\n]*?)?)[^\S\n]*'
+)
+
+# What WhisperX (and nearly everyone else) writes: fixed width, ASCII digits, single spaces
+_FIXED_TIME = r'[0-9]{2}:[0-9]{2}:[0-9]{2},[0-9]{3}'
+_FIXED_TIMESTAMP_RE = re.compile(f'{_FIXED_TIME} --> {_FIXED_TIME}')
+
+# How much of the content iter_subtitles() parses at a time
+_STREAM_WINDOW = 1 << 20
+
+_CACHE_SUFFIX = '.cache'
+# Bump whenever the parse output changes, so old caches are ignored
+_CACHE_FORMAT = 8
+
+
+def _decode_srt_bytes(raw: bytes) -> str:
+    """Decode SRT bytes with newlines normalised to \\n
+
+    Honours a BOM if present, else UTF-8 with a Latin-1 fallback.
+    """
+    # The UTF-32 LE BOM starts with the UTF-16 LE one, so it has to be checked first
+    if raw.startswith((codecs.BOM_UTF32_LE, codecs.BOM_UTF32_BE)):
+        wide_encoding = 'utf-32'
+    elif raw.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        wide_encoding = 'utf-16'
+    else:
+        wide_encoding = None
+
+    if wide_encoding is not None:
+        try:
+            content = raw.decode(wide_encoding)
+        except UnicodeDecodeError:
+            # Looked like a BOM but wasn't one
+            content = raw.decode('latin-1')
+        # A 0x0D byte can be part of some other character here, so fix the text instead
+        return content.replace('\r\n', '\n').replace('\r', '\n')
+
+    # In UTF-8 and Latin-1 a CR byte is always a CR, so normalise before decoding
+    if b'\r' in raw:
+        raw = raw.replace(b'\r\n', b'\n').replace(b'\r', b'\n')
+
+    encoding = 'utf-8-sig' if raw.startswith(codecs.BOM_UTF8) else 'utf-8'
+    try:
+        return raw.decode(encoding)
+    except UnicodeDecodeError:
+        # Latin-1 maps every byte, so this one cannot fail
+        return raw.decode('latin-1')
+
+
+def _to_milliseconds(hours: str, minutes: str, seconds: str, milliseconds: str) -> int:
+    # Integers all the way; the float only appears when dividing for seconds
+    return ((int(hours) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(milliseconds)
+
+
+def _split_blocks(content: str) -> List[str]:
+    """Split the content into blank-line separated blocks"""
+    if _SPACED_BLANK_LINE_RE.search(content) is None:
+        # Usual case: blank lines really are empty, so split on '\n\n' in C.
+        # Runs of blank lines leave empty blocks or a leading '\n', which parse() skips.
+        return content.split('\n\n')
+    return _BLANK_LINE_RE.split(content)
+
+
+# What the ord('0') in every digit adds up to in _fixed_time_ms
+_FIXED_TIME_ZERO = ((48 * 11 * 60 + 48 * 11) * 60 + 48 * 11) * 1000 + 48 * 111
+
+
+def _fixed_time_ms(digits: bytes, at: int) -> int:
+    """Milliseconds of the HH:MM:SS,mmm starting at digits[at], straight from the byte values"""
+    return ((((digits[at] * 10 + digits[at + 1]) * 60 + digits[at + 3] * 10 + digits[at + 4]) * 60
+             + digits[at + 6] * 10 + digits[at + 7]) * 1000
+            + digits[at + 9] * 100 + digits[at + 10] * 10 + digits[at + 11] - _FIXED_TIME_ZERO)
+
+
+def _read_timestamp(line: str) -> Optional[Tuple[str, int, int]]:
+    """(timestamp, start_time_ms, end_time_ms) of a timestamp line off the fixed layout
+
+    None if it isn't a timestamp line at all. One with '-->' that can't be read
+    is kept as written, with both times 0.
+    """
+    match = _TIMESTAMP_RE.fullmatch(line)
+    if match is not None:
+        timestamp, sh, sm, ss, sms, eh, em, es, ems = match.groups()
+        return timestamp, _to_milliseconds(sh, sm, ss, sms), _to_milliseconds(eh, em, es, ems)
+
+    if '-->' not in line:
+        return None
+
+    timestamp = line.strip()
+    print(f"Warning: Could not parse timestamp: {timestamp}")
+    return timestamp, 0, 0
+
+
+def _warn_bad_block(filename: str, block: str) -> None:
+    print(f"Warning: Could not parse subtitle block in {filename}: {block[:50]}...")
+
+
+def _parse_blocks_python(content: str, build_subtitle, filename: str) -> List['Subtitle']:
+    """Parse every well-formed block in the content, skipping the rest with a warning
+
+    build_subtitle(number, timestamp, text, start_time_ms, end_time_ms) makes each record.
+    src/_srt_fast.pyx is a compiled copy of this loop and replaces it when it has been built.
+    """
+    blocks = _split_blocks(content)
+    # Never more subtitles than blocks: size the list once, trim the skipped ones at the end
+    subtitles: list = [None] * len(blocks)
+    count = 0
+    for block in blocks:
+        # Only the first block can start with whitespace (leading blank lines)
+        if block[:1].isspace():
+            block = block.lstrip()
+
+        # Number, timestamp, and everything else is the text
+        lines = block.split('\n', 2)
+        if len(lines) < 3:
+            continue
+
+        number = lines[0]
+        if not number.isdecimal():
+            number = number.strip()
+            if not number.isdecimal():
+                _warn_bad_block(filename, block)
+                continue
+        if len(number) > _MAX_DIGITS:
+            _warn_bad_block(filename, block)
+            continue
+
+        timestamp = lines[1]
+        if _FIXED_TIMESTAMP_RE.fullmatch(timestamp):
+            # Fast path: the digits sit at known offsets, no groups or int() needed
+            digits = timestamp.encode('ascii')
+            start_time_ms = _fixed_time_ms(digits, 0)
+            end_time_ms = _fixed_time_ms(digits, 17)
+        else:
+            read = _read_timestamp(timestamp)
+            if read is None:
+                _warn_bad_block(filename, block)
+                continue
+            timestamp, start_time_ms, end_time_ms = read
+
+        # rstrip() hands back the same string when there is nothing to strip, so no copy
+        text = lines[2].rstrip()
+        # Skip empty subtitles - they're just noise from the AI model
+        if not text:
+            continue
+
+        subtitles[count] = build_subtitle(number, timestamp, text, start_time_ms, end_time_ms)
+        count += 1
+
+    del subtitles[count:]
+    return subtitles
+
+
+def _content_windows(content: str, size: int = _STREAM_WINDOW) -> Iterator[str]:
+    """Cut the content into pieces of roughly size characters, only ever between blocks"""
+    start = 0
+    while len(content) - start > size:
+        # Every '\n\n' lies inside a block separator, so both halves still parse the same
+        end = content.find('\n\n', start + size)
+        if end == -1:
+            break
+        yield content[start:end]
+        start = end + 2
+    yield content[start:]
+
+
+class Subtitle(NamedTuple):
+    """One subtitle block; a tuple under the hood, but also readable as subtitle['text']"""
     number: int
     timestamp: str
     text: str
     start_time: float
     end_time: float
+    start_time_ms: int
+    end_time_ms: int
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            if key not in _SUBTITLE_FIELDS:
+                raise KeyError(key)
+            return getattr(self, key)
+        return tuple.__getitem__(self, key)
+
+    def __contains__(self, key: object) -> bool:
+        # Like a dict: 'text' in subtitle asks about the field, not the values. That
+        # disagrees with iterating, which yields the values as for any tuple, but callers
+        # from the dict days only ever use `in` to check for a field.
+        return key in _SUBTITLE_FIELDS
+
+
+_SUBTITLE_FIELDS = frozenset(Subtitle._fields)
 
 
 class SRTFile:
-    def __init__(self, input_filepath: str):
+    def __init__(self, input_filepath: str, use_cache: bool = False):
         self.filepath = input_filepath
         self.filename = os.path.basename(input_filepath)
-        self.subtitles: List[SubtitleDict] = []
+        self.subtitles: List[Subtitle] = []
         self.original_content = ""
+        # Remember the parse in memory and in a JSON file next to it, see _load_cache
+        self.use_cache = use_cache
+
+    @property
+    def cache_filepath(self) -> str:
+        return self.filepath + _CACHE_SUFFIX
+
+    def time_arrays(self) -> Tuple[Sequence[int], Sequence[int], Sequence[int]]:
+        """The numbers, start times and end times (ms) of the subtitles as flat integer arrays
+
+        Built afresh from self.subtitles on every call, so keep the result rather
+        than calling this once per subtitle.
+        """
+        return (self._field_array('number'), self._field_array('start_time_ms'),
+                self._field_array('end_time_ms'))
+
+    def _field_array(self, field: str) -> Sequence[int]:
+        # attrgetter goes straight to the tuple slot, no Python-level call per subtitle
+        values = map(attrgetter(field), self.subtitles)
+        try:
+            return array('q', values)
+        except OverflowError:
+            # Some absurd number didn't fit in 64 bits; a plain list holds anything
+            return list(map(attrgetter(field), self.subtitles))
 
     def parse(self) -> None:
         """Parse the SRT file into subtitle objects.
 
         Programmer assumes the line endings are \n, not \r\n or \r
         """
-        try:
-            with open(self.filepath, 'r', encoding='utf-8') as file:
-                self.original_content = file.read()
-        except UnicodeDecodeError:
-            # Try with different encoding if UTF-8 fails
-            with open(self.filepath, 'r', encoding='latin-1') as file:
-                self.original_content = file.read()
+        if not self.use_cache:
+            self._parse_content()
+            return
 
-        # Split into subtitle blocks
-        blocks = re.split(r'\n\s*\n', self.original_content.strip())
+        # Stat before reading, so a write racing with us makes the caches look stale
+        stat = os.stat(self.filepath)
+        subtitles, self.original_content = _parse_cached(
+            os.path.abspath(self.filepath), stat.st_mtime_ns, stat.st_size)
 
-        for block in blocks:
-            if not block.strip():
-                continue
+        # The cached result is shared, so hand out our own list
+        self.subtitles = list(subtitles)
 
-            lines = block.strip().split('\n')
-            if len(lines) < 3:
-                continue
+    def _parse_cached_file(self, cache_key: Tuple[int, int]) -> None:
+        """Fill in the parse from the cache file, or parse the text and write the cache file"""
+        if self._load_cache(cache_key):
+            return
 
-            try:
-                # Parse subtitle number
-                subtitle_num = int(lines[0].strip())
+        self._parse_content()
+        self._write_cache(cache_key)
 
-                # Parse timestamp
-                timestamp = lines[1].strip()
+    def _parse_content(self) -> None:
+        """Read and parse the file"""
+        self._read_content()
+        self.subtitles = _parse_blocks(self.original_content, self._build_subtitle, self.filename)
 
-                # Parse text (everything after the timestamp)
-                text = '\n'.join(lines[2:])
+    def iter_subtitles(self) -> Iterator[Subtitle]:
+        """Yield the subtitles one at a time, for pipelines that don't need them all at once.
 
-                subtitle_had_content = text.strip()
-                # Skip empty subtitles - they're just noise from the AI model
-                if subtitle_had_content:
-                    subtitle: SubtitleDict = {
-                        'number': subtitle_num,
-                        'timestamp': timestamp,
-                        'text': text,
-                        'start_time': self._parse_time(timestamp.split(' --> ')[0]),
-                        'end_time': self._parse_time(timestamp.split(' --> ')[1])
-                    }
+        Reads the file into original_content like parse() does, but leaves
+        self.subtitles and the caches alone.
+        """
+        self._read_content()
+        build_subtitle = self._build_subtitle
+        for window in _content_windows(self.original_content):
+            yield from _parse_blocks(window, build_subtitle, self.filename)
 
-                    self.subtitles.append(subtitle)
+    def _read_content(self) -> None:
+        # Read the bytes once and pick the encoding from them, rather than
+        # re-reading the whole file when UTF-8 turns out to be wrong.
+        # Unbuffered: read() sizes one buffer from the file size, so an 8KB one is just overhead.
+        with open(self.filepath, 'rb', buffering=0) as file:
+            raw = file.read()
 
-            except (ValueError, IndexError) as e:
-                print(
-                    f"Warning: Could not parse subtitle block in {self.filename}: {block[:50]}...")
-                continue
+        # Same newline handling text mode used to give us
+        self.original_content = _decode_srt_bytes(raw)
+
+    def _load_cache(self, cache_key: Tuple[int, int]) -> bool:
+        """Fill in the parse from the cache file if it matches the SRT file's mtime and size"""
+        try:
+            with open(self.cache_filepath, 'r', encoding='utf-8') as file:
+                cached = json.load(file)
+            if cached['format'] != _CACHE_FORMAT or cached['key'] != list(cache_key):
+                return False
+            # Plain data only, so a planted cache file can't run code; rebuild the records here
+            subtitles = [tuple.__new__(Subtitle, (number, timestamp, text,
+                                                  start_time_ms / 1000, end_time_ms / 1000,
+                                                  start_time_ms, end_time_ms))
+                         for number, timestamp, text, start_time_ms, end_time_ms
+                         in cached['subtitles']]
+        except Exception:
+            # Missing, truncated or otherwise unreadable: just parse again
+            return False
+
+        # Reading and decoding the text again is cheaper than storing a copy of it
+        self._read_content()
+        self.subtitles = subtitles
+        return True
+
+    def _write_cache(self, cache_key: Tuple[int, int]) -> None:
+        cached = {
+            'format': _CACHE_FORMAT,
+            'key': list(cache_key),
+            # Only what the records can't work out for themselves
+            'subtitles': [(subtitle.number, subtitle.timestamp, subtitle.text,
+                           subtitle.start_time_ms, subtitle.end_time_ms)
+                          for subtitle in self.subtitles]
+        }
+        try:
+            with open(self.cache_filepath, 'w', encoding='utf-8') as file:
+                # dumps() encodes in C in one go; dump() writes piece by piece from Python
+                file.write(json.dumps(cached, ensure_ascii=False, check_circular=False,
+                                      separators=(',', ':')))
+        except OSError:
+            # A read-only folder just means no cache next time
+            pass
+
+    def _build_subtitle(self, number: str, timestamp: str, text: str,
+                        start_time_ms: int, end_time_ms: int) -> Subtitle:
+        """Turn the pieces of one block into a subtitle"""
+        # tuple.__new__ skips the namedtuple's Python-level __new__, which is slower than a dict
+        return tuple.__new__(Subtitle, (int(number), timestamp, text, start_time_ms / 1000,
+                                        end_time_ms / 1000, start_time_ms, end_time_ms))
 
     def _parse_time(self, time_str: str) -> float:
         """Convert SRT time format to seconds"""
         try:
-            time_str = time_str.strip()
-            # Format: HH:MM:SS,mmm
-            hours, minutes, seconds = time_str.split(':')
-            seconds, milliseconds = seconds.split(',')
-
-            total_seconds = int(hours) * 3600 + int(minutes) * \
-                60 + int(seconds) + int(milliseconds) / 1000
-            return total_seconds
-        except (ValueError, IndexError) as e:
-            print(f"Warning: Could not parse timestamp: {time_str}")
+            # Format: HH:MM:SS,mmm (or HH:MM:SS.mmm)
+            hours, minutes, rest = time_str.split(':')
+            seconds, milliseconds = rest.replace('.', ',').split(',')
+            total_ms = _to_milliseconds(hours, minutes, seconds, milliseconds)
+        except ValueError:
+            print(f"Warning: Could not parse timestamp: {time_str.strip()}")
             return 0.0
+
+        return total_ms / 1000
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_cached(filepath: str, mtime_ns: int, size: int):
+    """Parse a file at most once per (mtime, size), for use_cache callers that re-parse the same files"""
+    srt = SRTFile(filepath, use_cache=True)
+    srt._parse_cached_file((mtime_ns, size))
+    # A tuple of immutable Subtitles can be shared between callers as is
+    return tuple(srt.subtitles), srt.original_content
+
+
+# The compiled parser, if someone has built it (see the README); it imports from this module
+try:
+    from src._srt_fast import parse_blocks as _parse_blocks  # type: ignore[import-not-found]
+except ImportError:
+    _parse_blocks = _parse_blocks_python
@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Make the src package importable from every test module, once per session
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def test_dir():
+    """Create a temporary directory for test files"""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    # Cleanup after test
+    import shutil
+    if os.path.exists(temp_dir):
+        shutil.rmtree(temp_dir)
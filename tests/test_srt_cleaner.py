@@ -1,24 +1,11 @@
 import pytest
 import os
-import tempfile
-import sys
 from pathlib import Path
 
-# Add parent directory to path to import the modules
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from src.clean_whisperx_output import SrtCleaner, clean_srt_file
-from src.srt_file import SRTFile
-
-
-@pytest.fixture
-def test_dir():
-    """Create a temporary directory for test files"""
-    temp_dir = tempfile.mkdtemp()
-    yield temp_dir
-    # Cleanup after test
-    import shutil
-    if os.path.exists(temp_dir):
-        shutil.rmtree(temp_dir)
+from src.clean_whisperx_output import SrtCleaner, _is_junk, clean_many, clean_srt_file, open_batch_log
+from src.srt_file import SRTFile, Subtitle
+from src import junk_patterns
+from src.shared_utils import make_cleaned_srt_filename
 
 
 @pytest.fixture
@@ -178,8 +165,27 @@ class TestSrtCleaner:
         numbers = [sub['number'] for sub in cleaned_subtitles]
         assert numbers == list(range(1, len(cleaned_subtitles) + 1))
 
-    def test_prepare_cleaned_content_for_write(self, create_input_srt_file):
-        """Test that cleaned content is properly formatted for writing"""
+    def test_clean_in_one_pass(self, create_input_srt_file):
+        """Test that the single-pass clean matches find + remove"""
+        srt_file = SRTFile(create_input_srt_file)
+        srt_file.parse()
+
+        cleaner = SrtCleaner(srt_file)
+        result = cleaner.clean_in_one_pass()
+
+        # Phony subtitles keep their original numbers
+        phony_numbers = [sub['number'] for sub in result['phony_subtitles']]
+        assert phony_numbers == [3, 141, 144]
+
+        # Survivors are renumbered without gaps
+        cleaned_subtitles = result['subtitles_sans_bad_output']
+        assert len(cleaned_subtitles) == 8
+        numbers = [sub['number'] for sub in cleaned_subtitles]
+        assert numbers == list(range(1, len(cleaned_subtitles) + 1))
+        assert result['empty_string_count'] == 0
+
+    def test_saved_file_format(self, create_input_srt_file):
+        """Test that the cleaned file is written as blank-line separated blocks"""
         # Parse the file
         srt_file = SRTFile(create_input_srt_file)
         srt_file.parse()
@@ -189,28 +195,26 @@ class TestSrtCleaner:
         phony_subtitles = cleaner.find_phony_subtitles()
         result = cleaner.remove_junk_subtitles(phony_subtitles)
 
-        # Prepare content for writing
-        cleaned_content = cleaner.prepare_cleaned_content_for_write(
+        cleaned_filepath = cleaner.save_cleaned_file(
             result['subtitles_sans_bad_output'])
 
-        # Check format: should be [number, timestamp, text, empty, number, timestamp, text, empty, ...]
-        # But without the final empty line
-        assert isinstance(cleaned_content, list)
+        with open(cleaned_filepath, 'r', encoding='utf-8') as f:
+            saved_lines = f.read().split('\n')
 
         # Each subtitle takes 4 lines (number, timestamp, text, empty), except the last one (no empty)
-        # So for 7 subtitles: 7*4 - 1 = 27 lines
+        # So for 8 subtitles: 8*4 - 1 = 31 lines
         expected_lines = len(result['subtitles_sans_bad_output']) * 4 - 1
-        assert len(cleaned_content) == expected_lines
+        assert len(saved_lines) == expected_lines
 
         # Check first subtitle format
-        assert cleaned_content[0] == "1"  # Number
-        assert "-->" in cleaned_content[1]  # Timestamp
+        assert saved_lines[0] == "1"  # Number
+        assert "-->" in saved_lines[1]  # Timestamp
         # Text
-        assert cleaned_content[2] == "Je m'appelle Marinette, une fille comme les autres."
-        assert cleaned_content[3] == ""  # Empty line
+        assert saved_lines[2] == "Je m'appelle Marinette, une fille comme les autres."
+        assert saved_lines[3] == ""  # Empty line
 
         # Check that there's no empty line at the end
-        assert cleaned_content[-1] != ""
+        assert saved_lines[-1] != ""
 
     def test_save_cleaned_file(self, create_input_srt_file, test_dir):
         """Test that cleaned file is saved with correct suffix"""
@@ -223,10 +227,9 @@ class TestSrtCleaner:
         phony_subtitles = cleaner.find_phony_subtitles()
         result = cleaner.remove_junk_subtitles(phony_subtitles)
 
-        # Prepare and save
-        cleaned_content = cleaner.prepare_cleaned_content_for_write(
+        # Save
+        cleaned_filepath = cleaner.save_cleaned_file(
             result['subtitles_sans_bad_output'])
-        cleaned_filepath = cleaner.save_cleaned_file(cleaned_content)
 
         # Check that file was created with correct suffix
         assert os.path.exists(cleaned_filepath)
@@ -244,6 +247,18 @@ class TestSrtCleaner:
         assert "Je m'appelle Marinette" in saved_content
         assert "Oui, combien d'histoires Miraculaires" in saved_content
 
+    @pytest.mark.parametrize("filename,cleaned_filename", [
+        ("episode.srt", "episode - cleaned.srt"),
+        ("episode-input.srt", "episode - cleaned.srt"),
+        ("episode-input-fr.srt", "episode - cleaned.srt"),
+    ])
+    def test_cleaned_filename(self, test_dir, filename, cleaned_filename):
+        """Test the name of the cleaned file, which stays in the input's folder"""
+        nested_dir = os.path.join(test_dir, 'season-input')
+        filepath = os.path.join(nested_dir, filename)
+        assert make_cleaned_srt_filename(filepath) == os.path.join(
+            nested_dir, cleaned_filename)
+
 
 class TestIntegrationcleaneSrtFile:
     """Integration tests for the main clean_srt_file function"""
@@ -322,6 +337,104 @@ Yet another clean subtitle"""
         cleaned_srt.parse()
         assert len(cleaned_srt.subtitles) == 3
 
+    def test_clean_file_with_numbering_gap_and_no_phony_subtitles(self, test_dir):
+        """Test that the numbering is closed up even when nothing is removed"""
+        content = """1
+00:00:00,000 --> 00:00:05,000
+This is a clean subtitle
+
+5
+00:00:05,000 --> 00:00:10,000
+Another clean subtitle"""
+
+        filepath = os.path.join(test_dir, 'gap_test.srt')
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+        result = clean_srt_file(filepath, dry_run=False)
+
+        assert result['success'] is True
+        assert result['phony_count'] == 0
+
+        cleaned_srt = SRTFile(result['cleaned_file'])
+        cleaned_srt.parse()
+        assert [sub['number'] for sub in cleaned_srt.subtitles] == [1, 2]
+
+    @pytest.mark.parametrize("start,end", [
+        ('00:00:01.000', '00:00:04.000'),  # '.' before the milliseconds
+        ('00:00:01,000', '00:00:04,000 X1:100 X2:200 Y1:300 Y2:400'),  # position coordinates
+    ])
+    def test_clean_file_with_other_timestamp_layouts(self, test_dir, start, end):
+        """Test that timestamp lines off the usual layout are kept and written back as they were"""
+        content = f"""1
+{start} --> {end}
+Bonjour tout le monde
+
+2
+{start} --> {end}
+Sous-titrage ST' 501
+
+3
+{start} --> {end}
+Au revoir"""
+
+        filepath = os.path.join(test_dir, 'layout_test.srt')
+        with open(filepath, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+        result = clean_srt_file(filepath, dry_run=False)
+
+        assert result['success'] is True
+        assert result['phony_count'] == 1
+        assert result['subtitle_count'] == 2
+
+        cleaned_srt = SRTFile(result['cleaned_file'])
+        cleaned_srt.parse()
+        assert [sub['text'] for sub in cleaned_srt.subtitles] == ["Bonjour tout le monde", "Au revoir"]
+        assert all(sub['timestamp'] == f"{start} --> {end}" for sub in cleaned_srt.subtitles)
+        assert cleaned_srt.subtitles[0]['start_time'] == pytest.approx(1.0)
+
+    def test_batch_log_collects_every_file(self, create_input_srt_file, test_dir):
+        """Test that one batch log handle receives the removals of several files"""
+        second_filepath = os.path.join(test_dir, 'second_test.srt')
+        with open(create_input_srt_file, 'r', encoding='utf-8') as src, \
+                open(second_filepath, 'w', encoding='utf-8') as dst:
+            dst.write(src.read())
+
+        batch_log_path = os.path.join(test_dir, 'batch_log.txt')
+        with open_batch_log(batch_log_path) as batch_log:
+            for filepath in (create_input_srt_file, second_filepath):
+                result = clean_srt_file(
+                    filepath, dry_run=False, with_logging=True, batch_log_handle=batch_log)
+                assert result['success'] is True
+
+        with open(batch_log_path, 'r') as f:
+            logged_lines = f.read().splitlines()
+
+        # 3 phony subtitles per file
+        assert len(logged_lines) == 6
+        assert logged_lines.count("Sous-titrage ST' 501") == 4
+
+    def test_clean_many(self, create_input_srt_file, test_dir):
+        """Test cleaning several files in worker processes with a shared batch log"""
+        second_filepath = os.path.join(test_dir, 'second_test.srt')
+        with open(create_input_srt_file, 'r', encoding='utf-8') as src, \
+                open(second_filepath, 'w', encoding='utf-8') as dst:
+            dst.write(src.read())
+
+        batch_log_path = os.path.join(test_dir, 'batch_log.txt')
+        results = clean_many([create_input_srt_file, second_filepath], workers=2,
+                             dry_run=False, with_logging=True, batch_log_path=batch_log_path)
+
+        # Results come back in input order
+        assert [result['filepath'] for result in results] == [
+            create_input_srt_file, second_filepath]
+        assert all(result['success'] for result in results)
+        assert all(result['subtitle_count'] == 8 for result in results)
+
+        with open(batch_log_path, 'r') as f:
+            assert len(f.read().splitlines()) == 6
+
     def test_error_handling_non_existent_file(self):
         """Test handling of non-existent file"""
         result = clean_srt_file('non_existent_file.srt', dry_run=False)
@@ -348,6 +461,11 @@ class TestPhonyPatterns:
         "Sous-titrage FR",
         "Sous-titrage FR 2021",
         "SOUS-TITRAGE FR 2023",  # Test case insensitivity
+        "Sous-titrage Société Radio-Canada",
+        "Abonnez-vous!",
+        "SOUS-TITRAGE MFP.",  # Exact matches are case insensitive too
+        "Merci d'avoir regardé cette vidéo !",
+        "  Merci à tous",  # Anchored patterns still match with stray whitespace
     ])
     def test_phony_pattern_detection(self, test_dir, phony_text):
         """Test that various phony patterns are detected"""
@@ -376,3 +494,95 @@ Another normal subtitle"""
         # Should find exactly 1 phony subtitle
         assert len(phony_subtitles) == 1
         assert phony_subtitles[0]['number'] == 2
+
+
+class TestJunkMatchers:
+    """The optional Hyperscan matcher must agree with the re fallback"""
+
+    @pytest.mark.parametrize("text", [
+        "Sous-titrage ST' 501",
+        "sous-titrage par Amara.org",
+        "SOUS-TITRAGE FR 2023",
+        "Sous titrage fr",
+        "Je m'appelle Marinette",
+        "Le sous-sol est fermé",
+        "",
+        # Matches that run well past 20 bytes
+        "Sous-titrage Société Radio-Canada fr",
+        "Sous-titrage réalisé par la communauté d'Amara.org",
+    ])
+    def test_hyperscan_agrees_with_re(self, text):
+        if not junk_patterns.HYPERSCAN_AVAILABLE:
+            pytest.skip("hyperscan is not installed or SRT_CLEANER_HYPERSCAN is not set")
+
+        expected = junk_patterns.COMBINED_JUNK_RE.search(text) is not None
+        assert junk_patterns.hs_scan(text) == expected
+
+    @pytest.mark.parametrize("text", [
+        "Sous-titrage ST' 501",
+        "sous-titrage par Amara.org",
+        "SOUS-TITRAGE FR 2023",
+        "Sous titrage fr",
+        "Je m'appelle Marinette",
+        "par.orgSous-titrage MFP.st\x1c5",  # \s matches \x1c only outside re.ASCII
+    ])
+    def test_ascii_pattern_agrees_with_unicode_pattern(self, text):
+        is_junk = False
+        for group in junk_patterns.JUNK_PREFIX_GROUPS.values():
+            junk_re, ascii_junk_re = group[0]
+            assert ascii_junk_re is not None
+            expected = junk_re.search(text) is not None
+            is_junk = is_junk or expected
+            if junk_patterns.ascii_mode_safe(text):
+                assert (ascii_junk_re.search(text) is not None) == expected
+
+        assert _is_junk(text) == is_junk
+
+    @pytest.mark.parametrize("texts", [
+        ["Normal", "Sous-titrage FR", "Merci à tous", "Encore normal"],
+        ["İstanbul", "Sous-titrage ST' 501"],  # lower() changes the length here
+        ["Sous-titrage", "  Merci à tous  ", "sous-titrage fr\nsous-titrage fr"],
+        [],
+    ])
+    def test_bulk_scan_agrees_with_per_subtitle_check(self, test_dir, texts):
+        srt_file = SRTFile(os.path.join(test_dir, 'unused.srt'))
+        srt_file.subtitles = [Subtitle(i, '', text, 0.0, 0.0, 0, 0)
+                              for i, text in enumerate(texts, 1)]
+
+        expected = [i for i, text in enumerate(texts) if _is_junk(text)]
+        assert SrtCleaner(srt_file)._find_phony_indices() == expected
+
+    @pytest.mark.parametrize("pattern,prefix", [
+        (r'sous.titrage.*fr', "sous"),
+        (r'^Sous-titrage MFP\.$', "sous-titrage mfp."),
+        (r'amara\.org', "amara.org"),
+        (r'merci?', "merc"),
+        (r'\d+ sous', ""),
+        (r'abc|def', ""),
+    ])
+    def test_literal_prefix(self, pattern, prefix):
+        assert junk_patterns._literal_prefix(pattern) == prefix
+
+    @pytest.mark.parametrize("patterns,text", [
+        ([r'sous.titrage', r'(?i)merci'], "MERCI beaucoup"),  # global flag
+        ([r'(a)b', r'(\w+) \1'], "merci merci"),  # backreference
+        ([r'(?P<x>a)b', r'(?P<x>c)d', r'(?x) m e r c i'], "merci"),  # group name, verbose
+    ])
+    def test_uncombinable_patterns_searched_alone(self, patterns, text):
+        pairs = junk_patterns._compile_group(patterns)
+        assert any(junk_re.search(text) for junk_re, _ in pairs)
+
+    def test_invalid_pattern_rejected(self):
+        with pytest.raises(ValueError, match=r"sous\(titrage"):
+            junk_patterns._check_patterns([r'merci', r'sous(titrage'])
+
+    def test_re_fallback(self, create_input_srt_file, monkeypatch):
+        """Test detection without Hyperscan, whether or not it is installed"""
+        import src.clean_whisperx_output as cleaner_module
+        monkeypatch.setattr(cleaner_module, "HYPERSCAN_AVAILABLE", False)
+
+        srt_file = SRTFile(create_input_srt_file)
+        srt_file.parse()
+        phony_subtitles = SrtCleaner(srt_file).find_phony_subtitles()
+
+        assert [sub['number'] for sub in phony_subtitles] == [3, 141, 144]
@@ -1,23 +1,10 @@
 import pytest
 import os
-import tempfile
-from pathlib import Path
+import subprocess
 import sys
+from pathlib import Path
 
-# Add parent directory to path to import the SRTFile class
-sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
-from src.srt_file import SRTFile  # Adjust import path as needed
-
-
-@pytest.fixture
-def test_dir():
-    """Create a temporary directory for test files"""
-    temp_dir = tempfile.mkdtemp()
-    yield temp_dir
-    # Cleanup after test
-    import shutil
-    if os.path.exists(temp_dir):
-        shutil.rmtree(temp_dir)
+from src.srt_file import SRTFile, _content_windows, _parse_blocks_python, _parse_cached  # Adjust import path as needed
 
 
 @pytest.fixture
@@ -26,14 +13,23 @@ def dummy_srt_path():
     return os.path.join(os.path.dirname(__file__), 'dummy_srt_file.srt')
 
 
-@pytest.fixture
-def create_temp_srt(test_dir):
-    """Factory fixture to create temporary SRT files"""
+@pytest.fixture(scope='session')
+def create_temp_srt(tmp_path_factory):
+    """Factory fixture to create temporary SRT files
+
+    Files are shared for the whole session: the same content is only written
+    once, so tests must not modify them (see TestParseCache for ones that do).
+    """
+    created = {}
+
     def _create_srt(content, encoding='utf-8', filename='temp.srt'):
-        temp_file = os.path.join(test_dir, filename)
-        with open(temp_file, 'w', encoding=encoding) as f:
-            f.write(content)
-        return temp_file
+        key = (content, encoding, filename)
+        if key not in created:
+            temp_file = tmp_path_factory.mktemp('srt') / filename
+            with open(temp_file, 'w', encoding=encoding) as f:
+                f.write(content)
+            created[key] = str(temp_file)
+        return created[key]
     return _create_srt
 
 
@@ -101,6 +97,28 @@ class TestSRTFileBasics:
         assert srt.original_content.strip() == simple_srt_content.strip()
 
 
+    def test_iter_subtitles(self, dummy_srt_path):
+        """Test that streaming the subtitles gives the same ones parse() stores"""
+        srt = SRTFile(dummy_srt_path)
+        srt.parse()
+
+        streamed = SRTFile(dummy_srt_path)
+        assert list(streamed.iter_subtitles()) == srt.subtitles
+        assert streamed.original_content == srt.original_content
+        assert streamed.subtitles == []
+
+    @pytest.mark.parametrize("size", [0, 10, 100])
+    def test_content_windows_cut_between_blocks(self, dummy_srt_path, size):
+        """Test that parsing window by window loses or splits no subtitle"""
+        srt = SRTFile(dummy_srt_path)
+        srt.parse()
+
+        build_subtitle = srt._build_subtitle
+        windows = list(_content_windows(srt.original_content + "\n \n\n", size))
+        assert [subtitle for window in windows
+                for subtitle in _parse_blocks_python(window, build_subtitle, srt.filename)] == srt.subtitles
+
+
 class TestTimeProcessing:
     """Test time-related functionality"""
 
@@ -111,12 +129,19 @@ class TestTimeProcessing:
         ('01:00:00,000', 3600.0),
         ('00:00:02,343', 2.343),
         ('00:21:36,925', 1296.925),
+        ('00:00:05.000', 5.0),
     ])
     def test_parse_time(self, dummy_srt_path, time_str, expected):
         """Test time parsing with various formats"""
         srt = SRTFile(dummy_srt_path)
         assert srt._parse_time(time_str) == pytest.approx(expected, abs=0.001)
 
+    @pytest.mark.parametrize("time_str", ['', 'garbage', '00:05,000'])
+    def test_parse_invalid_time(self, dummy_srt_path, time_str):
+        """Test that unparseable times fall back to zero"""
+        srt = SRTFile(dummy_srt_path)
+        assert srt._parse_time(time_str) == 0.0
+
     def test_timestamp_with_spaces(self, create_temp_srt):
         """Test parsing timestamps with various spacing"""
         content = """1
@@ -131,6 +156,71 @@ Subtitle with extra spaces in timestamp"""
         assert srt.subtitles[0]['start_time'] == pytest.approx(0.0, abs=0.001)
         assert srt.subtitles[0]['end_time'] == pytest.approx(5.0, abs=0.001)
 
+    @pytest.mark.parametrize("timestamp,expected_ms", [
+        ('01:02:03,004 --> 01:02:04,005', (3723004, 3724005)),
+        ('01:02:03,004  -->  01:02:04,005', (3723004, 3724005)),
+        ('1:02:03,004 --> 1:02:04,005', (3723004, 3724005)),
+        ('100:00:00,000 --> 100:00:01,000', (360000000, 360001000)),
+        ('00:00:01.000 --> 00:00:02.500', (1000, 2500)),
+        ('0:0:1,5 --> 0:0:2,50', (1005, 2050)),
+        ('00:00:01,000 --> 00:00:02,000 X1:10 X2:20 Y1:30 Y2:40', (1000, 2000)),
+        ('00:00:01,000 --> 00:00:02,000 ', (1000, 2000)),
+        (' 00:00:01.000 --> 00:00:02.000  ', (1000, 2000)),
+        ('00:00:01,000 --> 00:00:02,000 X1:10 X2:20\t', (1000, 2000)),
+    ])
+    def test_fixed_and_free_layout_timestamps(self, create_temp_srt, timestamp, expected_ms):
+        """Test that the fixed-width fast path and the general path give the same times"""
+        temp_file = create_temp_srt(f"1\n{timestamp}\nText")
+        srt = SRTFile(temp_file)
+        srt.parse()
+
+        subtitle = srt.subtitles[0]
+        # Blanks around the line are not part of the timestamp
+        assert subtitle['timestamp'] == timestamp.strip()
+        assert (subtitle['start_time_ms'], subtitle['end_time_ms']) == expected_ms
+        assert srt._parse_time(timestamp.split()[0]) == expected_ms[0] / 1000
+
+    def test_unreadable_timestamp_kept(self, create_temp_srt, capsys):
+        """Test that a timestamp line that can't be read keeps its block, with zero times"""
+        temp_file = create_temp_srt("1\n00:00:01;000 --> 00:00:02;000\nStill a subtitle")
+        srt = SRTFile(temp_file)
+        srt.parse()
+
+        assert len(srt.subtitles) == 1
+        subtitle = srt.subtitles[0]
+        assert subtitle['timestamp'] == '00:00:01;000 --> 00:00:02;000'
+        assert subtitle['text'] == 'Still a subtitle'
+        assert (subtitle['start_time'], subtitle['end_time']) == (0.0, 0.0)
+        assert "Could not parse timestamp" in capsys.readouterr().out
+
+    def test_times_in_milliseconds(self, dummy_srt_path):
+        """Test that the exact integer times agree with the float seconds"""
+        srt = SRTFile(dummy_srt_path)
+        srt.parse()
+
+        first_subtitle = srt.subtitles[0]
+        assert first_subtitle['start_time_ms'] == 2343
+        assert first_subtitle['end_time_ms'] == 6109
+        for subtitle in srt.subtitles:
+            assert subtitle['start_time'] == subtitle['start_time_ms'] / 1000
+            assert subtitle['end_time'] == subtitle['end_time_ms'] / 1000
+
+    def test_time_arrays(self, dummy_srt_path):
+        """Test that the flat arrays hold the same numbers and times as the subtitles"""
+        srt = SRTFile(dummy_srt_path)
+        srt.parse()
+
+        numbers, start_times_ms, end_times_ms = srt.time_arrays()
+        assert list(numbers) == [s['number'] for s in srt.subtitles]
+        assert list(start_times_ms) == [s['start_time_ms'] for s in srt.subtitles]
+        assert list(end_times_ms) == [s['end_time_ms'] for s in srt.subtitles]
+        assert all(map(int.__lt__, start_times_ms, end_times_ms))
+
+        # They follow the subtitles, e.g. once the cleaner has dropped some
+        srt.subtitles = srt.subtitles[1:]
+        numbers, _, _ = srt.time_arrays()
+        assert list(numbers) == [s['number'] for s in srt.subtitles]
+
     def test_time_continuity(self, dummy_srt_path):
         """Test that subtitle times are logical (start < end)"""
         srt = SRTFile(dummy_srt_path)
@@ -202,7 +292,7 @@ class TestEdgeCases:
 
         assert len(srt.subtitles) == 0
 
-    def test_malformed_subtitle_block(self, create_temp_srt):
+    def test_malformed_subtitle_block(self, create_temp_srt, capsys):
         """Test handling of malformed subtitle blocks"""
         content = """1
 00:00:00,000 --> 00:00:05,000
@@ -224,6 +314,67 @@ This should be parsed"""
         assert len(srt.subtitles) == 2
         assert srt.subtitles[0]['number'] == 1
         assert srt.subtitles[1]['number'] == 3
+        assert "Could not parse subtitle block in temp.srt: Not a number" in capsys.readouterr().out
+
+    def test_malformed_timestamp_block(self, create_temp_srt):
+        """Test that a block whose timestamp line can't be read is skipped"""
+        content = """1
+00:00:00,000 --> 00:00:05,000
+Valid subtitle
+
+2
+00:00:05,000 to 00:00:10,000
+This should be skipped
+
+3
+00:00:10,000 --> 00:00:15,000
+This should be parsed"""
+
+        temp_file = create_temp_srt(content)
+        srt = SRTFile(temp_file)
+        srt.parse()
+
+        assert [subtitle['number'] for subtitle in srt.subtitles] == [1, 3]
+        assert srt.subtitles[1]['text'] == "This should be parsed"
+
+    def test_absurdly_long_numbers_skipped(self, create_temp_srt):
+        """Test that numbers too long for int() make the block malformed, not the parse fail"""
+        bad_block = "9" * 5000 + "\n00:00:05,000 --> 00:00:10,000\nToo long a number"
+        content = f"1\n00:00:00,000 --> 00:00:05,000\nValid\n\n{bad_block}"
+
+        temp_file = create_temp_srt(content)
+        srt = SRTFile(temp_file)
+        srt.parse()
+
+        assert [subtitle['number'] for subtitle in srt.subtitles] == [1]
+
+    def test_absurdly_long_hours_kept_unread(self, create_temp_srt):
+        """Test that hours too long for int() leave the timestamp unread, not the parse failing"""
+        content = "1\n" + "9" * 5000 + ":00:05,000 --> 00:00:10,000\nToo many hours"
+
+        temp_file = create_temp_srt(content)
+        srt = SRTFile(temp_file)
+        srt.parse()
+
+        assert len(srt.subtitles) == 1
+        assert srt.subtitles[0]['start_time_ms'] == srt.subtitles[0]['end_time_ms'] == 0
+
+    def test_lowered_int_digit_limit(self, create_temp_srt):
+        """Test that a lowered int() digit limit also makes long numbers malformed, not fatal"""
+        bad_blocks = ("9" * 700 + "\n00:00:05,000 --> 00:00:10,000\nToo long a number\n\n"
+                      "3\n" + "9" * 700 + ":00:05,000 --> 00:00:10,000\nToo many hours")
+        temp_file = create_temp_srt(f"1\n00:00:00,000 --> 00:00:05,000\nValid\n\n{bad_blocks}")
+
+        # The limit is read at import, so it takes a fresh interpreter
+        script = ("import sys; from src.srt_file import SRTFile; srt = SRTFile(sys.argv[1]); "
+                  "srt.parse(); print([subtitle.number for subtitle in srt.subtitles])")
+        repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        result = subprocess.run([sys.executable, '-c', script, temp_file], cwd=repo_root,
+                                env={**os.environ, 'PYTHONINTMAXSTRDIGITS': '640'},
+                                capture_output=True, text=True)
+
+        assert result.returncode == 0, result.stderr
+        assert result.stdout.splitlines()[-1] == '[1, 3]'
 
     def test_extra_blank_lines(self, create_temp_srt):
         """Test parsing with extra blank lines between subtitles"""
@@ -272,6 +423,48 @@ Café résumé naïve"""
         # The text might be decoded differently, but parsing should not fail
         assert srt.subtitles[0]['text'] is not None
 
+    @pytest.mark.parametrize("encoding", ['utf-8-sig', 'utf-16', 'utf-32'])
+    def test_bom_encodings(self, test_dir, encoding):
+        """Test that files starting with a byte order mark are decoded by it"""
+        content = """1
+00:00:00,000 --> 00:00:05,000
+Café résumé naïve"""
+
+        temp_file = os.path.join(test_dir, 'bom.srt')
+        with open(temp_file, 'w', encoding=encoding) as f:
+            f.write(content)
+
+        srt = SRTFile(temp_file)
+        srt.parse()
+
+        # The BOM must not end up glued to the first subtitle number
+        assert len(srt.subtitles) == 1
+        assert srt.subtitles[0]['number'] == 1
+        assert srt.subtitles[0]['text'] == "Café résumé naïve"
+
+    @pytest.mark.parametrize("encoding", ['utf-8', 'latin-1', 'utf-16', 'utf-32'])
+    @pytest.mark.parametrize("newline", ['\r\n', '\r'])
+    def test_windows_and_mac_line_endings(self, test_dir, encoding, newline):
+        """Test that CRLF and CR line endings parse the same as LF"""
+        content = """1
+00:00:00,000 --> 00:00:05,000
+Première ligne
+Deuxième ligne
+
+2
+00:00:05,000 --> 00:00:10,000
+Fin"""
+
+        temp_file = os.path.join(test_dir, 'newlines.srt')
+        with open(temp_file, 'wb') as f:
+            f.write(content.replace('\n', newline).encode(encoding))
+
+        srt = SRTFile(temp_file)
+        srt.parse()
+
+        assert '\r' not in srt.original_content
+        assert [s['text'] for s in srt.subtitles] == ["Première ligne\nDeuxième ligne", "Fin"]
+
     @pytest.mark.parametrize("encoding", ['utf-8'])
     def test_various_encodings(self, test_dir, encoding):
         """Test parsing files with various encodings"""
@@ -297,6 +490,110 @@ Test subtitle"""
             pytest.skip(f"Encoding {encoding} not available on this system")
 
 
+class TestCompiledParser:
+    """Test the optional Cython parser against the pure Python one"""
+
+    @pytest.mark.parametrize("content", [
+        None,  # the dummy file
+        "\n\n 1 \n00:00:01,000  -->  00:00:02,000\nA\n\n2\n00:00:0٣,000 --> 00:00:04,000\nB",
+        "1\n00:00:01,000 --> 00:00:02,000\n\n2\n0:00:01,000 --> 0:00:02,000\n  C  \n \n3\nbad\nD",
+        "1\n00:00:01.000 --> 00:00:02.000 X1:1\nA\n\n2\n1 --> 2\nB\n\nx\n00:00:01,000 --> 00:00:02,000\nC",
+    ])
+    def test_agrees_with_python_parser(self, dummy_srt_path, content):
+        fast = pytest.importorskip("src._srt_fast")
+        if content is None:
+            srt = SRTFile(dummy_srt_path)
+            srt.parse()
+            content = srt.original_content
+
+        build_subtitle = SRTFile(dummy_srt_path)._build_subtitle
+        assert (fast.parse_blocks(content, build_subtitle, 'test.srt') ==
+                _parse_blocks_python(content, build_subtitle, 'test.srt'))
+
+
+class TestParseCache:
+    """Test the optional on-disk parse cache"""
+
+    @pytest.fixture
+    def create_temp_srt(self, test_dir):
+        """These tests rewrite files and leave caches beside them, so each gets its own"""
+        def _create_srt(content, filename='temp.srt'):
+            temp_file = os.path.join(test_dir, filename)
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                f.write(content)
+            return temp_file
+        return _create_srt
+
+    def test_cache_written_and_reused(self, create_temp_srt, simple_srt_content, monkeypatch):
+        temp_file = create_temp_srt(simple_srt_content)
+        srt = SRTFile(temp_file, use_cache=True)
+        srt.parse()
+        assert os.path.exists(srt.cache_filepath)
+
+        # A second parse must come from the cache file, not the text (nor from memory)
+        _parse_cached.cache_clear()
+        monkeypatch.setattr(SRTFile, '_build_subtitle', None)
+        cached = SRTFile(temp_file, use_cache=True)
+        cached.parse()
+        assert cached.subtitles == srt.subtitles
+        assert cached.original_content == srt.original_content
+        assert cached.time_arrays() == srt.time_arrays()
+
+    def test_stale_cache_ignored(self, create_temp_srt, simple_srt_content):
+        temp_file = create_temp_srt(simple_srt_content)
+        SRTFile(temp_file, use_cache=True).parse()
+
+        # Different size, so the cache no longer matches
+        create_temp_srt(simple_srt_content + "\n\n3\n00:00:10,000 --> 00:00:15,000\nThird")
+        srt = SRTFile(temp_file, use_cache=True)
+        srt.parse()
+        assert len(srt.subtitles) == 3
+
+    def test_corrupt_cache_ignored(self, create_temp_srt, simple_srt_content):
+        temp_file = create_temp_srt(simple_srt_content)
+        srt = SRTFile(temp_file, use_cache=True)
+        with open(srt.cache_filepath, 'wb') as f:
+            f.write(b'not json')
+
+        srt.parse()
+        assert len(srt.subtitles) == 2
+
+    def test_repeat_parse_reuses_result(self, create_temp_srt, simple_srt_content, monkeypatch):
+        temp_file = create_temp_srt(simple_srt_content)
+        srt = SRTFile(temp_file, use_cache=True)
+        srt.parse()
+
+        # Same mtime and size: no second look at the file or its cache
+        monkeypatch.setattr(SRTFile, '_parse_cached_file', None)
+        again = SRTFile(temp_file, use_cache=True)
+        again.parse()
+        assert again.subtitles == srt.subtitles
+        assert again.subtitles is not srt.subtitles
+        monkeypatch.undo()
+
+    def test_repeat_parse_rereads_without_cache(self, create_temp_srt, simple_srt_content):
+        temp_file = create_temp_srt(simple_srt_content)
+        SRTFile(temp_file).parse()
+
+        # Same size, and the mtime may not have ticked over, but the new text must show up
+        create_temp_srt(simple_srt_content.replace("Hello", "Howdy"))
+        srt = SRTFile(temp_file)
+        srt.parse()
+        assert srt.subtitles[0]['text'] == "Howdy World"
+
+        # Once the file changes it is parsed again
+        create_temp_srt(simple_srt_content + "\n\n3\n00:00:10,000 --> 00:00:15,000\nNew")
+        changed = SRTFile(temp_file)
+        changed.parse()
+        assert len(changed.subtitles) == 3
+
+    def test_no_cache_by_default(self, create_temp_srt, simple_srt_content):
+        temp_file = create_temp_srt(simple_srt_content)
+        srt = SRTFile(temp_file)
+        srt.parse()
+        assert not os.path.exists(srt.cache_filepath)
+
+
 class TestDataIntegrity:
     """Test data integrity and ordering"""
 
@@ -311,6 +608,20 @@ class TestDataIntegrity:
             assert subtitle['number'] > prev_num
             prev_num = subtitle['number']
 
+    def test_subtitle_record(self, dummy_srt_path):
+        """Test that subtitles read the same as attributes, by key and unpacked"""
+        srt = SRTFile(dummy_srt_path)
+        srt.parse()
+
+        subtitle = srt.subtitles[0]
+        assert subtitle.number == subtitle['number'] == subtitle[0] == 1
+        assert subtitle.text == subtitle['text']
+        number, timestamp, *_ = subtitle
+        assert timestamp == '00:00:02,343 --> 00:00:06,109'
+        assert 'text' in subtitle and 'nonexistent' not in subtitle
+        with pytest.raises(KeyError):
+            subtitle['count']
+
     def test_all_subtitles_have_required_fields(self, dummy_srt_path):
         """Test that all parsed subtitles have required fields"""
         srt = SRTFile(dummy_srt_path)